@@ -0,0 +1,226 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Offscreen rendering benchmark for the anaglyph camera.
+
+Builds synthetic scenes of increasing size (atoms, triangle surfaces and
+volume maps) and draws them with the mono camera, the ChimeraX split stereo
+cameras and every anaglyph mode at several resolutions, including those
+listed in Auflösung.txt.  Frame rate, per-frame latency percentiles and
+peak resident memory are written as JSON.  Run with the CPU-only OSMesa
+renderer on Linux:
+
+    chimerax --offscreen --nogui --exit --script "benchmarks/bench_anaglyph.py --output new.json"
+
+and compare two reports with
+
+    python benchmarks/compare.py new.json baseline.json --threshold 0.1
+'''
+
+import os
+import sys
+import json
+import argparse
+from time import perf_counter
+
+default_sizes = {
+    'atoms': (1000, 10000, 100000),
+    'surface': (10000, 100000, 1000000),  # Triangles
+    'volume': (64, 128, 192),             # Grid points along each axis
+}
+quick_sizes = {'atoms': (1000,), 'surface': (10000,), 'volume': (64,)}
+
+cameras = ('mono', 'sbs', 'tb', 'anaglyph direct', 'anaglyph framebuffer',
+           'anaglyph shader', 'anaglyph shader tiled', 'anaglyph reproject')
+
+
+def main(session, argv):
+    p = argparse.ArgumentParser(prog='bench_anaglyph.py')
+    p.add_argument('--output', default='anaglyph_benchmark.json')
+    p.add_argument('--frames', type=int, default=20)
+    p.add_argument('--warmup', type=int, default=3)
+    p.add_argument('--resolutions', nargs='*', help='WIDTHxHEIGHT, default 800x600 and Auflösung.txt')
+    p.add_argument('--scenes', nargs='*', default=list(default_sizes.keys()))
+    p.add_argument('--cameras', nargs='*', default=list(cameras))
+    p.add_argument('--quick', action='store_true', help='smallest scene of each kind only')
+    args = p.parse_args(argv)
+
+    resolutions = ([_parse_size(r) for r in args.resolutions] if args.resolutions
+                   else [(800, 600)] + wall_resolutions())
+    sizes = quick_sizes if args.quick else default_sizes
+
+    view = session.main_view
+    if view.render is None:
+        session.ui.initialize_offscreen_rendering()
+    results = []
+    for scene in args.scenes:
+        for size in sizes[scene]:
+            session.models.close(session.models.list())
+            t0 = perf_counter()
+            make_scene(session, scene, size)
+            session.logger.info('Created %s scene of size %d in %.1f seconds'
+                                % (scene, size, perf_counter() - t0))
+            for camera_name in args.cameras:
+                for width, height in resolutions:
+                    r = run_case(session, camera_name, width, height, args.frames, args.warmup)
+                    r.update({'scene': scene, 'size': size})
+                    results.append(r)
+                    session.logger.info('%s %d %s %dx%d: %.2f fps, p95 %.1f ms'
+                                        % (scene, size, camera_name, width, height,
+                                           r['fps'], r['latency_ms']['p95']))
+
+    report = {'meta': run_metadata(view.render), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    session.logger.info('Wrote %d benchmark results to %s' % (len(results), args.output))
+
+
+def wall_resolutions():
+    '''Window sizes listed in Auflösung.txt at the top of the repository.'''
+    import re
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(os.path.dirname(here), 'Auflösung.txt')
+    if not os.path.exists(path):
+        return [(1900, 1200), (13506, 4320)]
+    with open(path, encoding='utf-8') as f:
+        return [(int(w), int(h)) for w, h in re.findall(r'(\d+)\s*x\s*(\d+)', f.read())]
+
+
+def make_scene(session, kind, size):
+    from numpy import random, float32
+    rng = random.default_rng(0)
+    if kind == 'atoms':
+        from chimerax.atomic import AtomicStructure
+        s = AtomicStructure(session, name='bench atoms')
+        res = s.new_residue('UNK', 'A', 1)
+        coords = rng.uniform(-0.5, 0.5, (size, 3)) * 10 * size ** (1 / 3)
+        for xyz in coords:
+            a = s.new_atom('C', 'C')
+            a.coord = xyz
+            res.add_atom(a)
+        session.models.add([s])
+    elif kind == 'surface':
+        from chimerax.core.models import Surface
+        from chimerax.surface import sphere_geometry2
+        va, na, ta = sphere_geometry2(size)
+        s = Surface('bench surface', session)
+        s.set_geometry(50 * va, na, ta)
+        session.models.add([s])
+    elif kind == 'volume':
+        from chimerax.map_data import ArrayGridData
+        from chimerax.map import volume_from_grid_data
+        from scipy.ndimage import gaussian_filter
+        a = gaussian_filter(rng.standard_normal((size, size, size)), 3).astype(float32)
+        v = volume_from_grid_data(ArrayGridData(a, name='bench volume'), session)
+        v.set_parameters(surface_levels=[a.mean() + 2 * a.std()])
+        v.show(style='surface')
+    else:
+        raise ValueError('Unknown benchmark scene "%s"' % kind)
+    session.main_view.view_all()
+
+
+def make_camera(name):
+    if name == 'mono':
+        from chimerax.graphics import MonoCamera
+        return MonoCamera()
+    if name in ('sbs', 'tb'):
+        from chimerax.graphics.camera import SplitStereoCamera
+        return SplitStereoCamera(layout='side-by-side' if name == 'sbs' else 'top-bottom')
+    from chimerax.ummbas_anaglyph.camera import AnaglyphCamera
+    mode = name.split()[1]
+    tile_size = (2048, 2048) if name.endswith('tiled') else None
+    return AnaglyphCamera(mode=mode, tile_size=tile_size)
+
+
+def run_case(session, camera_name, width, height, frames, warmup):
+    from numpy import array, percentile
+    from OpenGL import GL
+    from chimerax.graphics.opengl import Framebuffer
+    from chimerax.geometry import rotation
+    view = session.main_view
+    r = view.render
+    r.make_current()
+    old_camera = view.camera
+    c = make_camera(camera_name)
+    c.position = start = old_camera.position
+    view.camera = c
+    b = view.drawing_bounds()
+    center = b.center() if b else start.origin()
+    axis = start.transform_vector((0, 1, 0))
+    fb = Framebuffer('benchmark', r.opengl_context, width, height)
+    _reset_peak_memory()
+    times = []
+    try:
+        for f in range(warmup + frames):
+            # Turn the scene so no frame can reuse the previous one.
+            c.position = rotation(axis, 2.0 * f, center) * start
+            t0 = perf_counter()
+            r.push_framebuffer(fb)
+            view.draw(c, swap_buffers=False)
+            GL.glFinish()
+            r.pop_framebuffer()
+            if f >= warmup:
+                times.append(1000 * (perf_counter() - t0))
+    finally:
+        fb.delete()
+        view.camera = old_camera
+        c.delete()
+    t = array(times)
+    return {
+        'camera': camera_name,
+        'width': width,
+        'height': height,
+        'frames': frames,
+        'fps': 1000 * len(t) / t.sum(),
+        'latency_ms': {'p50': float(percentile(t, 50)), 'p95': float(percentile(t, 95)),
+                       'max': float(t.max())},
+        'peak_rss_mb': _peak_memory_mb(),
+    }
+
+
+def run_metadata(render):
+    from OpenGL import GL
+    import platform, subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=here,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    renderer = GL.glGetString(GL.GL_RENDERER)
+    return {
+        'commit': commit,
+        'renderer': renderer.decode() if isinstance(renderer, bytes) else renderer,
+        'machine': platform.node(),
+        'python': platform.python_version(),
+    }
+
+
+def _reset_peak_memory():
+    # Linux only, writing 5 resets the peak resident set size VmHWM.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_memory_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _parse_size(text):
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+
+if 'session' in globals():  # Run as a ChimeraX script
+    main(session, sys.argv[1:])
@@ -0,0 +1,61 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Compare two anaglyph benchmark reports written by bench_anaglyph.py.
+
+A case regresses if its frame rate dropped or its 95th percentile latency
+grew by more than the threshold fraction.  Exits with status 1 if any case
+regressed, so it can gate a build.
+
+    python benchmarks/compare.py new.json baseline.json --threshold 0.1
+'''
+
+import sys
+import json
+import argparse
+
+
+def case_key(r):
+    return (r['scene'], r['size'], r['camera'], r['width'], r['height'])
+
+
+def compare(new, baseline, threshold):
+    '''Return list of (key, measure, baseline value, new value) regressions.'''
+    base = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in new['results']:
+        b = base.get(case_key(r))
+        if b is None:
+            continue
+        if r['fps'] < (1 - threshold) * b['fps']:
+            regressions.append((case_key(r), 'fps', b['fps'], r['fps']))
+        p95, bp95 = r['latency_ms']['p95'], b['latency_ms']['p95']
+        if p95 > (1 + threshold) * bp95:
+            regressions.append((case_key(r), 'p95 ms', bp95, p95))
+    return regressions
+
+
+def main(argv):
+    p = argparse.ArgumentParser(prog='compare.py')
+    p.add_argument('new')
+    p.add_argument('baseline')
+    p.add_argument('--threshold', type=float, default=0.1,
+                   help='allowed fractional slowdown, default 0.1')
+    args = p.parse_args(argv)
+    with open(args.new) as f:
+        new = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(new, baseline, args.threshold)
+    for (scene, size, camera, w, h), measure, old, cur in regressions:
+        print('%-8s %8d %-22s %5dx%-5d %-7s %10.2f -> %10.2f'
+              % (scene, size, camera, w, h, measure, old, cur))
+    print('%d regressions beyond %.0f%% in %d cases (baseline commit %s)'
+          % (len(regressions), 100 * args.threshold, len(new['results']),
+             baseline.get('meta', {}).get('commit')))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Measure the cold import cost of the anaglyph bundle modules.
+
+Each module is imported in a fresh interpreter with -X importtime and its
+cumulative import time is reported.  ChimeraX imports only the package at
+startup, the cmd module on the first anaglyph command and the camera module
+on the first "anaglyph on".  Use the Python that comes with ChimeraX, for
+instance
+
+    chimerax --nogui --exit --script "benchmarks/import_time.py --repeat 5"
+
+Running it on two commits shows the change in cold-start cost.
+'''
+
+import sys
+import json
+import argparse
+import subprocess
+
+modules = (
+    ('startup', 'chimerax.ummbas_anaglyph'),
+    ('commands', 'chimerax.ummbas_anaglyph.cmd'),
+    ('camera', 'chimerax.ummbas_anaglyph.camera'),
+    ('tool', 'chimerax.ummbas_anaglyph.tool'),
+)
+
+
+def import_time(python, module):
+    '''Cumulative import time in milliseconds of module in a new interpreter.'''
+    p = subprocess.run([python, '-X', 'importtime', '-c', 'import %s' % module],
+                       capture_output=True, text=True)
+    if p.returncode != 0:
+        return None
+    for line in p.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    return None
+
+
+def main(argv):
+    p = argparse.ArgumentParser(prog='import_time.py')
+    p.add_argument('--python', default=sys.executable)
+    p.add_argument('--repeat', type=int, default=3, help='report the fastest of this many runs')
+    p.add_argument('--output', help='also write the times as JSON')
+    args = p.parse_args(argv)
+
+    times = {}
+    for label, module in modules:
+        t = [import_time(args.python, module) for i in range(args.repeat)]
+        t = [v for v in t if v is not None]
+        times[label] = min(t) if t else None
+        print('%-9s %-34s %s' % (label, module, 'failed' if not t else '%8.1f ms' % min(t)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(times, f, indent=1)
+    return times
+
+
+if __name__ == '__main__' or 'session' in globals():
+    main(sys.argv[1:])
@@ -33,12 +33,31 @@ class _MyAPI(BundleAPI):
 
         raise ValueError("trying to start unknown tool: %s" % ti.name)
     
+    @staticmethod
+    def register_command(bi, ci, logger):
+        # bi is an instance of chimerax.core.toolshed.BundleInfo
+        # ci is an instance of chimerax.core.toolshed.CommandInfo
+        # logger is an instance of chimerax.core.logger.Logger
+
+        # This method is called once for each command listed
+        # in bundle_info.xml.
+        from . import cmd
+        from chimerax.core.commands import register
+        func_name = ci.name.replace(' ', '_')
+        desc = getattr(cmd, func_name + '_desc')
+        if desc.synopsis is None:
+            desc.synopsis = ci.synopsis
+        register(ci.name, desc, getattr(cmd, func_name), logger=logger)
+
     @staticmethod
     def get_class(class_name):
         # class_name will be a ng
         if class_name == "Anaglyph":
             from . import tool
             return tool.Anaglyph
+        if class_name == "AnaglyphState":
+            from . import state
+            return state.AnaglyphState
         raise ValueError("Unknown class name '%s'" % class_name)
 
 # Create the ``bundle_api`` object that ChimeraX expects.
@@ -0,0 +1,289 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Render anaglyph stills and turntable movies for many structures offscreen.
+
+Frames are drawn into an offscreen framebuffer and read back through two
+pixel pack buffers, so frame N+1 is drawn while frame N is copied out.
+Copied frames are written or piped to an encoder on a separate thread.
+Finished inputs are recorded in a manifest in the output directory and are
+skipped when the batch is run again.
+
+Typical use on a render node:
+
+    chimerax --offscreen --nogui --cmd "anaglyph export /data/*.cif outputDir /out frames 120"
+'''
+
+import os
+from OpenGL import GL
+
+manifest_name = 'anaglyph_batch.json'
+
+
+def stereo_batch(session, inputs, output_dir, frames=1, camera_path=None,
+                 width=1920, height=1080, mode='direct', encoder=None, resume=True,
+                 camera_options=None):
+    '''
+    Render each input file with an AnaglyphCamera and save the frames.
+
+    Parameters
+    ----------
+    inputs : list of str
+      Files opened one at a time with the ChimeraX open command.
+    output_dir : str
+      Directory for images, movies and the resume manifest.
+    frames : int
+      Frames per input.  One frame is saved as <name>.png, more as
+      <name>/frame_00000.png ... unless an encoder is given.
+    camera_path : callable or None
+      Called as camera_path(session, camera, start, frame, frames) to
+      position the camera for each frame, start is the camera position after
+      view all.  Default is a turntable about the vertical axis.
+    encoder : str or None
+      Shell command reading raw RGBA frames on stdin.  {output}, {width} and
+      {height} are replaced, for example
+      "ffmpeg -y -f rawvideo -pix_fmt rgba -s {width}x{height} -r 25 -i - {output}.mp4"
+    resume : bool
+      Skip inputs recorded as finished and still frames already on disk.
+    camera_options : dict
+      Extra AnaglyphCamera arguments such as eye_separation_scene.
+
+    Returns total frames rendered and frames per second.
+    '''
+    from time import perf_counter
+    from chimerax.core.commands import run, quote_if_necessary
+    os.makedirs(output_dir, exist_ok=True)
+    done = _read_manifest(output_dir) if resume else set()
+    path = turntable if camera_path is None else camera_path
+
+    view = session.main_view
+    if view.render is None and hasattr(session.ui, 'initialize_offscreen_rendering'):
+        session.ui.initialize_offscreen_rendering()
+    if view.render is None:
+        from chimerax.core.errors import UserError
+        raise UserError('No OpenGL rendering available, start ChimeraX with --offscreen')
+
+    from .camera import AnaglyphCamera
+    old_camera = view.camera
+    c = AnaglyphCamera(mode=mode, **(camera_options or {}))
+    c.position = old_camera.position
+    view.camera = c
+
+    start = perf_counter()
+    total = 0
+    reader = _FrameReader(view.render, width, height)
+    try:
+        for input_path in inputs:
+            if os.path.abspath(input_path) in done:
+                session.logger.info('Skipping %s, already rendered' % input_path)
+                continue
+            t0 = perf_counter()
+            run(session, 'close', log=False)
+            run(session, 'open %s' % quote_if_necessary(input_path), log=False)
+            view.view_all()
+            name = os.path.splitext(os.path.basename(input_path))[0]
+            writer = _frame_writer(os.path.join(output_dir, name), frames, width, height, encoder)
+            try:
+                n = reader.render_frames(session, c, frames, path, writer, resume and encoder is None)
+            finally:
+                writer.close()
+            total += n
+            done.add(os.path.abspath(input_path))
+            _write_manifest(output_dir, done)
+            t = perf_counter() - t0
+            session.logger.info('Rendered %d frames of %s in %.1f seconds, %.1f frames/sec'
+                                % (n, input_path, t, n / t if t > 0 else 0))
+    finally:
+        reader.delete()
+        view.camera = old_camera
+        c.delete()
+
+    t = perf_counter() - start
+    fps = total / t if t > 0 else 0
+    session.logger.info('Batch rendered %d frames in %.1f seconds, %.1f frames/sec' % (total, t, fps))
+    return total, fps
+
+
+def turntable(session, camera, start, frame, frames, axis=(0, 1, 0)):
+    '''Rotate the starting camera position about the screen axis through the scene center.'''
+    if frames <= 1:
+        return
+    b = session.main_view.drawing_bounds()
+    center = b.center() if b else start.origin()
+    from chimerax.geometry import rotation
+    r = rotation(start.transform_vector(axis), 360.0 * frame / frames, center)
+    camera.position = r * start
+
+
+class _FrameReader:
+    '''Offscreen framebuffer and double-buffered asynchronous pixel readback.'''
+
+    def __init__(self, render, width, height):
+        from chimerax.graphics.opengl import Framebuffer
+        render.make_current()
+        self._render = render
+        self.size = (width, height)
+        self._framebuffer = Framebuffer('anaglyph batch', render.opengl_context, width, height)
+        nbytes = 4 * width * height
+        self._buffers = GL.glGenBuffers(2)
+        for b in self._buffers:
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, b)
+            GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, nbytes, None, GL.GL_STREAM_READ)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+
+    def delete(self):
+        self._render.make_current()
+        GL.glDeleteBuffers(2, self._buffers)
+        self._framebuffer.delete()
+
+    def render_frames(self, session, camera, frames, camera_path, writer, skip_existing):
+        view = session.main_view
+        r = self._render
+        start = camera.position
+        pending = None  # (frame, buffer index) waiting to be copied
+        count = 0
+        for f in range(frames):
+            camera_path(session, camera, start, f, frames)
+            if skip_existing and writer.exists(f):
+                continue
+            b = count % 2  # Alternate per rendered frame, skipped frames use no buffer
+            r.push_framebuffer(self._framebuffer)
+            view.draw(camera, swap_buffers=False)
+            if not camera.frame_complete:
+                view.draw(camera, swap_buffers=False)  # Tile grid changed, draw all tiles
+            self._start_read(b)
+            r.pop_framebuffer()
+            if pending is not None:
+                writer.write(pending[0], self._finish_read(pending[1]))
+            pending = (f, b)
+            count += 1
+        if pending is not None:
+            writer.write(pending[0], self._finish_read(pending[1]))
+        return count
+
+    def _start_read(self, b):
+        from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels
+        from ctypes import c_void_p
+        w, h = self.size
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, self._buffers[b])
+        glReadPixels(0, 0, w, h, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, c_void_p(0))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+
+    def _finish_read(self, b):
+        from numpy import empty, uint8
+        from ctypes import memmove
+        w, h = self.size
+        rgba = empty((h, w, 4), uint8)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, self._buffers[b])
+        ptr = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, rgba.nbytes, GL.GL_MAP_READ_BIT)
+        memmove(rgba.ctypes.data, ptr, rgba.nbytes)
+        GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        return rgba[::-1]  # OpenGL rows start at the bottom
+
+
+def _frame_writer(path, frames, width, height, encoder):
+    if encoder is not None:
+        return _EncoderWriter(encoder.format(output=path, width=width, height=height))
+    return _ImageWriter(path, frames)
+
+
+class _ThreadedWriter:
+    '''Write frames on a separate thread so the next frame can render.'''
+
+    def __init__(self):
+        from queue import Queue
+        from threading import Thread
+        self._queue = Queue(maxsize=2)
+        self._error = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, frame, rgba):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame, rgba))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def exists(self, frame):
+        return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is None:
+                try:
+                    self._write_frame(*item)
+                except Exception as e:
+                    self._error = e
+
+
+class _ImageWriter(_ThreadedWriter):
+
+    def __init__(self, path, frames):
+        if frames > 1:
+            os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._frames = frames
+        _ThreadedWriter.__init__(self)
+
+    def exists(self, frame):
+        return os.path.exists(self._frame_path(frame))
+
+    def _frame_path(self, frame):
+        if self._frames == 1:
+            return self._path + '.png'
+        return os.path.join(self._path, 'frame_%05d.png' % frame)
+
+    def _write_frame(self, frame, rgba):
+        from PIL import Image
+        path = self._frame_path(frame)
+        # Write under a temporary name so an interrupted batch never leaves a
+        # truncated image that resume would take as finished.
+        tmp = path + '.tmp'
+        Image.fromarray(rgba, 'RGBA').save(tmp, format='PNG')
+        os.replace(tmp, path)
+
+
+class _EncoderWriter(_ThreadedWriter):
+
+    def __init__(self, command):
+        from subprocess import Popen, PIPE
+        self._process = Popen(command, shell=True, stdin=PIPE)
+        _ThreadedWriter.__init__(self)
+
+    def close(self):
+        try:
+            _ThreadedWriter.close(self)
+        finally:
+            self._process.stdin.close()
+            status = self._process.wait()
+        if status != 0:
+            raise RuntimeError('Encoder exited with status %d' % status)
+
+    def _write_frame(self, frame, rgba):
+        self._process.stdin.write(rgba.tobytes())
+
+
+def _read_manifest(output_dir):
+    import json
+    path = os.path.join(output_dir, manifest_name)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f)['completed'])
+
+
+def _write_manifest(output_dir, done):
+    import json
+    path = os.path.join(output_dir, manifest_name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'completed': sorted(done)}, f, indent=1)
+    os.replace(path + '.tmp', path)
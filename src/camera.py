@@ -0,0 +1,504 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+# === UCSF ChimeraX Copyright ===
+
+# Copyright 2016 Regents of the University of California.
+
+# All rights reserved.  This software provided pursuant to a
+
+# license agreement containing restrictions on its disclosure,
+
+# duplication and use.  For details see:
+
+# http://www.rbvi.ucsf.edu/chimerax/docs/licensing.html
+
+# This notice must be embedded in or attached to all copies,
+
+# including partial copies, of the software or any revisions
+
+# or derivations thereof.
+
+# === UCSF ChimeraX Copyright ===
+
+#import default chimerax camera class
+from chimerax.graphics.camera import Camera
+from chimerax.graphics import camera
+from OpenGL.GL import glColorMask, GL_TRUE, GL_FALSE, glClear, glViewport, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT
+from OpenGL.GL import glClearColor, glGetFloatv, GL_COLOR_CLEAR_VALUE
+from chimerax.geometry import place
+from chimerax.graphics.drawing import Drawing
+from numpy import array, float32, int32
+from functools import partial
+from .fbpool import FramebufferPool, texture_scale
+from . import state
+
+# Default largest eye target edge in pixels when tiling, bounds eye memory.
+default_tile_size = 4096
+
+class AnaglyphCamera(Camera):
+    '''Anaglyph stereo rendering camera.'''
+
+    name = 'anaglyph'
+
+    # 'direct' draws both eyes into the current framebuffer under the red/cyan
+    # color masks.  'framebuffer' renders each eye offscreen and composites.
+    # 'shader' renders full color eyes offscreen and combines them in one
+    # shader pass using the color matrices of color_method.  'reproject'
+    # renders one eye with depth and synthesizes the other from it, windows
+    # larger than the tile size use 'shader' instead so eye memory stays bounded.
+    modes = state.modes
+
+    def __init__(self, layout='anaglyph', eye_separation_scene=0.9, swap_eyes=False, convergence=0,
+                 mode='direct', color_method='dubois', tile_size=None):
+        Camera.__init__(self)
+        self.field_of_view = 30  # Horizontal field, degrees
+        self.eye_separation_scene = eye_separation_scene  # Angstroms
+        self.swap_eyes = swap_eyes  # Used for cross-eye stereo
+        self.convergence = convergence  # Used for cross-eye and wall-eye stereo
+        self._framebuffer = {'left': None, 'right': None}  # Framebuffer for rendering each eye
+        self._framebuffer_pool = FramebufferPool()  # Owns the eye framebuffers
+        self._drawing = {'left': None, 'right': None}  # Drawing of rectangle with cube map texture
+        self._drawing_texture_scale = {}  # Texture coordinate range of each eye drawing
+        self.layout = "anaglyph"
+        if mode not in self.modes:
+            raise ValueError('Unknown anaglyph mode "%s", expected one of %s' % (mode, ', '.join(self.modes)))
+        self.mode = mode
+        self._compositor = None  # Single pass shader compositor for 'shader' mode
+        self._reprojection = None  # Point scatter pass for 'reproject' mode
+        self._reprojection_compositor = None  # Hole filling compositor for 'reproject' mode
+        self._source_projection = None  # Projection matrix of the rendered eye
+        self.color_method = color_method
+        # Largest offscreen eye target (width, height) in pixels.  Bigger windows
+        # are rendered tile by tile reusing the eye framebuffers.  None uses
+        # default_tile_size.  Never larger than the OpenGL maximum texture size.
+        self.tile_size = tile_size
+        self._tiles = None  # Lower left corner of each tile in window pixels, None if untiled
+        self._tile_window_size = None
+        self._frame_views = None  # View count fixed at the start of the frame being drawn
+        self._frame_mode = None  # Mode used for the frame being drawn
+        self._render = None  # Render of the last frame, gives the window size for the view count
+        # False if the mode or tile grid changed after the view count of the
+        # last frame was fixed, so some tiles were not drawn.  Image captures
+        # should draw again in that case.
+        self.frame_complete = True
+        # Fraction of the window size used for offscreen eye images when not
+        # tiled, upscaled when composited.  Set by adaptive_scale if enabled.
+        self.render_scale = 1.0
+        self.adaptive_scale = None  # AdaptiveRenderScale holding a target frame rate
+        self.timer = None  # StereoTimer recording stage times when enabled
+
+    @property
+    def color_method(self):
+        return self._color_method
+
+    @color_method.setter
+    def color_method(self, method):
+        from .color_matrices import methods
+        if method not in methods:
+            raise ValueError('Unknown anaglyph color method "%s", expected one of %s'
+                             % (method, ', '.join(methods)))
+        self._color_method = method
+        if self._compositor:
+            self._compositor.method = method
+
+    @property
+    def render_scale_applies(self):
+        '''
+        Whether eye images are rendered at render_scale.  Direct mode has no
+        eye images and tiles are always rendered at full resolution.
+        '''
+        mode = self._frame_mode or self.mode
+        return mode != 'direct' and self._tiles is None
+
+    def delete(self):
+        # Release everything even if deleting one of the resources fails.
+        deletes = [self._framebuffer_pool.delete]
+        deletes.extend(d.delete for d in self._drawing.values() if d)
+        for p in (self._compositor, self._reprojection, self._reprojection_compositor):
+            if p:
+                deletes.append(partial(p.delete, make_current=True))
+        if self.adaptive_scale:
+            deletes.append(partial(self.adaptive_scale.delete, make_current=True))
+        if self.timer:
+            deletes.append(partial(self.timer.delete, make_current=True))
+
+        self._framebuffer = {'left': None, 'right': None}
+        self._drawing = {'left': None, 'right': None}
+        self._drawing_texture_scale = {}
+        self._compositor = self._reprojection = self._reprojection_compositor = None
+        self.adaptive_scale = None
+        self.timer = None
+
+        error = None
+        for delete in deletes:
+            try:
+                delete()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def view(self, camera_position, view_num):
+        '''
+        Return the Place coordinate frame for a specific camera view number.
+        As a transform it maps camera coordinates to scene coordinates.
+        '''
+        if view_num is None:
+            v = camera_position
+        else:
+            # Stereo eyes view in same direction with position shifted along x.
+            s = -1 if view_num % 2 == 0 else 1
+            es = self.eye_separation_scene
+            t = place.translation((s * 0.5 * es, 0, 0))
+            v = camera_position * t
+            if self.convergence != 0:
+                r = place.rotation((0, 1, 0), s * self.convergence)
+                v = v * r
+        return v
+
+    def number_of_views(self):
+        '''Number of views rendered by camera mode.'''
+        if self._frame_views is None:
+            # Start of a frame, the view count must not change until it is drawn.
+            size = None if self._render is None else self._render.render_size()
+            self._frame_mode = self._mode_for_size(size)
+            self._frame_views = self._views(self._frame_mode, size)
+        return self._frame_views
+
+    def projection_matrix(self, near_far_clip, view_num, window_size):
+        '''The 4 by 4 OpenGL projection matrix for rendering the scene.'''
+        mode = self._frame_mode or self.mode
+        if mode == 'reproject':
+            pm = Camera.projection_matrix(self, near_far_clip, view_num, window_size)
+            self._source_projection = pm  # Needed to unproject source eye depth
+            return pm
+        if self._tiles is None or view_num is None or mode == 'direct':
+            return Camera.projection_matrix(self, near_far_clip, view_num, window_size)
+        # Sub-frustum of the full window covering this tile.
+        from math import radians, tan
+        near, far = near_far_clip
+        ww, wh = self._tile_window_size
+        tw, th = window_size
+        x, y = self._tiles[min(view_num // 2, len(self._tiles) - 1)]
+        w = 2 * near * tan(0.5 * radians(self.field_of_view))
+        h = w * wh / ww
+        # Supersampled image capture shifts the view by a fraction of a pixel.
+        xps, yps = self.pixel_shift(view_num)
+        left = -0.5 * w + w * (x - xps) / ww
+        bottom = -0.5 * h + h * (y - yps) / wh
+        right, top = left + w * tw / ww, bottom + h * th / wh
+        return camera.frustum(left, right, bottom, top, near, far)
+
+    def view_all(self, bounds, window_size=None, pad=0):
+        '''
+        Return the shift that makes the camera completely show models
+        having specified bounds.  The camera view direction is not changed.
+        '''
+        self.position = camera.perspective_view_all(bounds, self.position, self.field_of_view, window_size, pad)
+
+    def ray(self, window_x, window_y, window_size):
+        '''
+        Return origin and direction in scene coordinates of sight line
+        for the specified window pixel position.  Uses the right eye.
+        '''
+        w, h = window_size
+        if self.layout == 'side-by-side':
+            wsize = (w / 2, h)
+            if window_x > w / 2:
+                view_num = 1
+                wx, wy = window_x - w / 2, window_y
+            else:
+                view_num = 0
+                wx, wy = window_x, window_y
+        else:
+            wsize = (w, h / 2)
+            if window_y > h / 2:
+                view_num = 1
+                wx, wy = window_x, window_y - h / 2
+            else:
+                view_num = 0
+                wx, wy = window_x, window_y
+        d = camera.perspective_direction(wx, wy, wsize, self.field_of_view)
+        p = self.get_position(view_num=1)
+        ds = p.transform_vector(d)  # Convert camera to scene coordinates
+        return (p.origin(), ds)
+
+    def view_width(self, point):
+        return camera.perspective_view_width(point, self.position.origin(), self.field_of_view)
+
+    def set_render_target(self, view_num, render):
+        '''Set the OpenGL drawing buffer and viewport to render the scene.'''
+        if view_num == 0:
+            self._start_frame(render)
+            if self.adaptive_scale and self.render_scale_applies:
+                self.adaptive_scale.frame_started(render)
+        eye = self._eye(view_num)
+        mode = self._frame_mode
+        if mode == 'direct':
+            if self.timer:
+                self.timer.start_stage(eye, render)
+            self._set_direct_render_target(view_num, render)
+            return
+        if mode == 'reproject':
+            if self.timer:
+                self.timer.start_stage(eye, render)
+            fb = self._eye_framebuffer(self._eye(0), render, depth_texture=True)
+            render.push_framebuffer(fb)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            return
+        if view_num > 0:
+            render.pop_framebuffer()  # Pop previous eye framebuffer
+            if self._tiles is not None and view_num % 2 == 0:
+                if self.timer:
+                    self.timer.start_stage('composite', render)
+                self._combine_tile(view_num // 2 - 1, render)
+        if self.timer:
+            self.timer.start_stage(eye, render)
+        fb = self._eye_framebuffer(eye, render)
+        render.push_framebuffer(fb)  # Push eye framebuffer
+
+        # Clear framebuffer and apply color mask based on eye
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        if mode == 'shader':
+            return  # Full color eyes, the compositor separates the channels
+        if eye == 'left':
+            glColorMask(GL_TRUE, GL_FALSE, GL_FALSE, GL_TRUE)  # Red only
+        else:
+            glColorMask(GL_FALSE, GL_TRUE, GL_TRUE, GL_TRUE)  # Green and Blue (Cyan)
+
+    def _set_direct_render_target(self, view_num, render):
+        '''
+        Draw both eyes straight into the current framebuffer.  The color mask
+        keeps the eyes in separate channels.  ChimeraX draws the background
+        after setting each render target, which under the mask clears depth
+        and only the channels of this eye, so no clear is needed here.
+        '''
+        eye = self._eye(view_num)
+        if view_num == 0:
+            glViewport(0, 0, *render.render_size())
+        if eye == 'left':
+            glColorMask(GL_TRUE, GL_FALSE, GL_FALSE, GL_TRUE)  # Red only
+        else:
+            glColorMask(GL_FALSE, GL_TRUE, GL_TRUE, GL_TRUE)  # Green and Blue (Cyan)
+
+    def combine_rendered_camera_views(self, render):
+        '''Render the cube map using a projection.'''
+        if self.timer:
+            self.timer.start_stage('composite', render)
+        self._combine(render)
+        self._frame_views = self._frame_mode = None
+        if self.adaptive_scale:
+            self.adaptive_scale.frame_drawn()
+        if self.timer:
+            self.timer.end_frame(self._framebuffer_pool)
+
+    def _combine(self, render):
+        mode = self._frame_mode
+        if mode == 'direct':
+            # Eyes are already in the framebuffer, nothing to composite.
+            glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+            return
+        if mode == 'reproject':
+            self._combine_reprojected(render)
+            return
+        render.pop_framebuffer()  # Pop the right eye framebuffer.
+
+        if self._tiles is not None:
+            self._combine_tile(self._frame_views // 2 - 1, render)
+            glViewport(0, 0, *render.render_size())  # Overlays are drawn next
+            return
+
+        glViewport(0, 0, *render.render_size())
+        if mode == 'shader':
+            self._combine_with_shader(render)
+            return
+
+        # Clear the main framebuffer
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self._combine_with_masks(render)
+
+    def _combine_with_masks(self, render):
+        '''Draw both eye textures into the current viewport under color masks.'''
+        # Draw left eye
+        glColorMask(GL_TRUE, GL_FALSE, GL_FALSE, GL_TRUE)
+        drawings = [self._eye_drawing('left')]
+        from chimerax.graphics.drawing import draw_overlays
+        draw_overlays(drawings, render)
+
+        # Draw right eye
+        glColorMask(GL_FALSE, GL_TRUE, GL_TRUE, GL_TRUE)
+        drawings = [self._eye_drawing('right')]
+        draw_overlays(drawings, render)
+
+        # Reset color mask to default
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+
+    def _combine_with_shader(self, render):
+        '''Combine both eye textures in a single pass over the current viewport.'''
+        if self._compositor is None:
+            from .compositor import AnaglyphCompositor
+            self._compositor = AnaglyphCompositor(self.color_method)
+        fb = self._framebuffer
+        self._compositor.draw(render, fb['left'].color_texture, fb['right'].color_texture,
+                              tex_scale=texture_scale(fb['left']))
+
+    def _combine_reprojected(self, render):
+        '''Synthesize the second eye from the first and composite both.'''
+        render.pop_framebuffer()  # Pop the source eye framebuffer.
+        source, target = self._eye(0), self._eye(1)
+        sfb = self._framebuffer[source]
+        tfb = self._eye_framebuffer(target, render, depth_texture=True)
+        from .reprojection import DepthReprojection, ReprojectionCompositor, reprojection_matrix
+        if self._reprojection is None:
+            self._reprojection = DepthReprojection()
+            self._reprojection_compositor = ReprojectionCompositor()
+        m = reprojection_matrix(self._source_projection, self.get_position(0), self.get_position(1))
+
+        # Clear alpha to 0 so the compositor can find uncovered pixels.
+        render.push_framebuffer(tfb)
+        clear_color = glGetFloatv(GL_COLOR_CLEAR_VALUE)
+        glClearColor(0, 0, 0, 0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glClearColor(*clear_color)
+        image_size = sfb.viewport[2:]
+        self._reprojection.draw(render, sfb.color_texture, sfb.depth_texture, m, image_size)
+        render.pop_framebuffer()
+
+        glViewport(0, 0, *render.render_size())
+        c = self._reprojection_compositor
+        c.method = self.color_method
+        c.draw(render, sfb.color_texture, sfb.depth_texture, tfb.color_texture, tfb.depth_texture,
+               m, source_is_left=(source == 'left'), image_size=image_size)
+
+    def _start_frame(self, render):
+        '''
+        Fit the tile grid to the current render size.  If the mode or number
+        of tiles differs from those fixed for this frame, only the views that
+        fit in that count are drawn and the frame is drawn again.
+        '''
+        views = self.number_of_views()
+        mode = self._frame_mode
+        self._render = render
+        size = render.render_size()
+        self.frame_complete = (mode == self._mode_for_size(size) and views == self._views(mode, size))
+        if not self.frame_complete:
+            self.redraw_needed = True
+
+    def _mode_for_size(self, window_size):
+        '''Reprojection is not tiled, windows beyond the tile size use shader mode.'''
+        if self.mode == 'reproject' and window_size is not None:
+            tw, th = self._tile_limit()
+            ww, wh = window_size
+            if ww > tw or wh > th:
+                return 'shader'
+        return self.mode
+
+    def _views(self, mode, window_size):
+        '''Number of views to draw a window in a mode, updates the tile grid.'''
+        if mode in ('direct', 'reproject'):
+            self._tiles = None
+            return 1 if mode == 'reproject' else 2  # Reprojection synthesizes the second eye
+        if window_size is not None:
+            self._update_tiles(window_size)
+        return 2 if self._tiles is None else 2 * len(self._tiles)  # Left and right eye for each tile
+
+    def _tile_limit(self):
+        tw, th = self.tile_size or (default_tile_size, default_tile_size)
+        m = _max_texture_size()
+        return min(tw, m), min(th, m)
+
+    def _update_tiles(self, window_size):
+        '''
+        Split the window into tiles no larger than the tile size.  Views are
+        ordered left eye, right eye for each tile in turn.
+        '''
+        ww, wh = window_size
+        tw, th = self._tile_limit()
+        tw, th = min(tw, ww), min(th, wh)
+        if (tw, th) == (ww, wh):
+            tiles = None
+        else:
+            tiles = [(x, y) for y in range(0, wh, th) for x in range(0, ww, tw)]
+        self._tiles = tiles
+        self._tile_window_size = window_size
+        self._tile_target_size = (tw, th)
+
+    def _combine_tile(self, tile, render):
+        '''Copy the eye images of a finished tile into its window rectangle.'''
+        if tile >= len(self._tiles):
+            return  # Tile count changed after the view count was fixed
+        x, y = self._tiles[tile]
+        # Edge tiles extend past the window and are clipped by the framebuffer.
+        glViewport(x, y, *self._tile_target_size)
+        if self._frame_mode == 'shader':
+            self._combine_with_shader(render)
+        else:
+            self._combine_with_masks(render)
+
+    def _eye(self, view_num):
+        if self.swap_eyes:
+            return 'right' if view_num % 2 == 0 else 'left'
+        return 'left' if view_num % 2 == 0 else 'right'
+
+    def _eye_framebuffer(self, eye, render, depth_texture=False):
+        if self._tiles is None:
+            # Only a frame whose mode was fixed before the window grew beyond
+            # the tile size is limited here, it is drawn again.
+            size = self._limit_size(self._scaled_size(render.render_size()))
+        else:
+            size = self._tile_target_size
+        pool = self._framebuffer_pool
+        pool.max_size = _max_texture_size()
+        fb = pool.framebuffer(eye, size, render.opengl_context, depth_texture)
+        if pool.pending:
+            self.redraw_needed = True  # Draw again once the size has settled
+        if fb is not self._framebuffer[eye]:
+            self._framebuffer[eye] = fb
+            d = self._drawing[eye]
+            if d:
+                d.texture = fb.color_texture  # Update drawing texture
+        return fb
+
+    def _limit_size(self, size):
+        '''Largest size with the same aspect ratio within the tile size.'''
+        tw, th = self._tile_limit()
+        w, h = size
+        f = min(1, tw / w, th / h)
+        if f == 1:
+            return size
+        return (max(1, int(f * w)), max(1, int(f * h)))
+
+    def _scaled_size(self, window_size):
+        s = self.render_scale
+        if s == 1:
+            return window_size
+        w, h = window_size
+        return (max(1, int(s * w + 0.5)), max(1, int(s * h + 0.5)))
+
+    def _eye_drawing(self, eye):
+        d = self._drawing[eye]
+        if d is None:
+            self._drawing[eye] = d = Drawing('%s eye' % eye)
+            va = array(((-1, -1, 0), (1, -1, 0), (1, 1, 0), (-1, 1, 0)), float32)
+            ta = array(((0, 1, 2), (0, 2, 3)), int32)
+            tc = array(((0, 0), (1, 0), (1, 1), (0, 1)), float32)
+            d.set_geometry(va, None, ta)
+            d.use_lighting = False
+            d.texture_coordinates = tc
+            d.texture = self._framebuffer[eye].color_texture
+            d.opaque_texture = True
+        # Eye image may only fill the lower left part of the framebuffer.
+        sx, sy = texture_scale(self._framebuffer[eye])
+        if self._drawing_texture_scale.get(eye, (1, 1)) != (sx, sy):
+            d.texture_coordinates = array(((0, 0), (sx, 0), (sx, sy), (0, sy)), float32)
+            self._drawing_texture_scale[eye] = (sx, sy)
+        return d
+
+
+_max_texture = None
+def _max_texture_size():
+    global _max_texture
+    if _max_texture is None:
+        from OpenGL.GL import glGetIntegerv, GL_MAX_TEXTURE_SIZE
+        _max_texture = int(glGetIntegerv(GL_MAX_TEXTURE_SIZE))
+    return _max_texture
@@ -0,0 +1,231 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+from chimerax.core.commands import CmdDesc, BoolArg, FloatArg, IntArg, StringArg, EnumOf
+from chimerax.core.commands import OpenFileNamesArg, SaveFolderNameArg, SaveFileNameArg
+from chimerax.core.errors import UserError
+from .state import modes
+
+
+def anaglyph(session, enable=None, separation=None, convergence=None, mode=None,
+             color_method=None, swap_eyes=None, tile_size=None):
+    '''
+    Turn the anaglyph camera on or off, or report its settings.
+
+    Parameters
+    ----------
+    enable : bool
+      On replaces the current camera by the anaglyph camera at the same
+      position.  Off puts back the previous camera.
+    separation : float
+      Eye separation in scene units (Angstroms).
+    convergence : float
+      Inward rotation of each eye in degrees.
+    mode : string
+      Rendering mode, one of direct, framebuffer, shader or reproject.
+    color_method : string
+      Color matrices used by shader and reproject modes.
+    tile_size : int
+      Largest eye image edge in pixels for framebuffer and shader modes,
+      larger windows are rendered in tiles.
+    '''
+    from .state import anaglyph_state
+    s = anaglyph_state(session)
+    options = {'eye_separation_scene': separation, 'convergence': convergence,
+               'mode': mode, 'color_method': color_method, 'swap_eyes': swap_eyes,
+               'tile_size': _tile_size(tile_size)}
+    options = {k: v for k, v in options.items() if v is not None}
+    if separation is not None and separation < 0:
+        raise UserError('Eye separation must not be negative, got %g' % separation)
+
+    if enable is False:
+        s.off()
+    elif enable or options:
+        s.on(**options)
+    p = s.parameters
+    ts = p['tile_size']
+    session.logger.info('Anaglyph %s, %s mode, separation %.3g, convergence %.3g, colors %s%s%s'
+                        % ('on' if s.enabled else 'off', p['mode'], p['eye_separation_scene'],
+                           p['convergence'], p['color_method'],
+                           ', tile size %d' % ts[0] if ts else '',
+                           ', eyes swapped' if p['swap_eyes'] else ''))
+
+
+def _tile_size(size):
+    if size is None:
+        return None
+    if size < 1:
+        raise UserError('Tile size must be positive, got %d' % size)
+    return (size, size)
+
+
+def _color_method_arg():
+    from .color_matrices import methods
+    return EnumOf(methods)
+
+
+anaglyph_desc = CmdDesc(
+    optional=[('enable', BoolArg)],
+    keyword=[('separation', FloatArg),
+             ('convergence', FloatArg),
+             ('mode', EnumOf(modes)),
+             ('color_method', _color_method_arg()),
+             ('swap_eyes', BoolArg),
+             ('tile_size', IntArg)],
+    synopsis='turn anaglyph stereo camera on or off')
+
+
+def anaglyph_scale(session, enable=None, target_fps=None, min_scale=None):
+    '''
+    Report or set the adaptive eye render resolution of the anaglyph camera.
+
+    Parameters
+    ----------
+    enable : bool
+      Turn adaptive resolution on or off.  Off renders at full resolution.
+    target_fps : float
+      Frame rate to hold, implies enable.
+    min_scale : float
+      Smallest fraction of the window size used for eye images.
+    '''
+    c = _anaglyph_camera(session)
+    if target_fps is not None and target_fps <= 0:
+        raise UserError('Target frame rate must be positive, got %g' % target_fps)
+    if min_scale is not None and not 0 < min_scale <= 1:
+        raise UserError('Minimum scale must be between 0 and 1, got %g' % min_scale)
+    if enable is None and (target_fps is not None or min_scale is not None):
+        enable = True
+
+    if enable is False:
+        if c.adaptive_scale:
+            c.adaptive_scale.delete(make_current=True)
+            c.adaptive_scale = None
+        c.render_scale = 1.0
+        c.redraw_needed = True
+    elif enable:
+        a = c.adaptive_scale
+        if a is None:
+            from .render_scale import AdaptiveRenderScale
+            c.adaptive_scale = a = AdaptiveRenderScale(session, c)
+        if target_fps is not None:
+            a.target_fps = target_fps
+        if min_scale is not None:
+            a.min_scale = min_scale
+
+    a = c.adaptive_scale
+    if a is None:
+        msg = 'Anaglyph render scale %.3g, adaptive scaling off' % c.render_scale
+    else:
+        fps = 'measuring' if a.fps is None else '%.1f' % a.fps
+        msg = ('Anaglyph render scale %.3g, frame rate %s, target %.3g, minimum scale %.3g'
+               % (c.render_scale, fps, a.target_fps, a.min_scale))
+    if not c.render_scale_applies:
+        msg += (', not used %s, eyes render at full resolution'
+                % ('in direct mode' if c.mode == 'direct' else 'while the window is tiled'))
+    session.logger.info(msg)
+    return c.render_scale
+
+
+anaglyph_scale_desc = CmdDesc(
+    optional=[('enable', BoolArg)],
+    keyword=[('target_fps', FloatArg),
+             ('min_scale', FloatArg)],
+    synopsis='report or set adaptive anaglyph eye render resolution')
+
+
+def anaglyph_export(session, inputs, output_dir=None, frames=1, width=1920, height=1080,
+                    mode='direct', separation=None, tile_size=None, encoder=None, resume=True):
+    '''
+    Render anaglyph images or turntable movies of each input file offscreen.
+
+    Parameters
+    ----------
+    inputs : list of str
+      Files to open one at a time.
+    output_dir : str
+      Directory for the images, movies and resume manifest.
+    frames : int
+      Turntable frames per input, 1 for a still image.
+    tile_size : int
+      Largest eye image edge in pixels for framebuffer and shader modes.
+    encoder : str
+      Shell command reading raw RGBA frames on stdin, see batch.stereo_batch.
+    resume : bool
+      Skip inputs finished by an earlier run into the same directory.
+    '''
+    if output_dir is None:
+        raise UserError('Must specify outputDir')
+    if frames < 1:
+        raise UserError('Frames must be at least 1, got %d' % frames)
+    options = {} if separation is None else {'eye_separation_scene': separation}
+    if tile_size is not None:
+        options['tile_size'] = _tile_size(tile_size)
+    from .batch import stereo_batch
+    return stereo_batch(session, inputs, output_dir, frames=frames, width=width, height=height,
+                        mode=mode, encoder=encoder, resume=resume, camera_options=options)
+
+
+anaglyph_export_desc = CmdDesc(
+    required=[('inputs', OpenFileNamesArg)],
+    keyword=[('output_dir', SaveFolderNameArg),
+             ('frames', IntArg),
+             ('width', IntArg),
+             ('height', IntArg),
+             ('mode', EnumOf(modes)),
+             ('separation', FloatArg),
+             ('tile_size', IntArg),
+             ('encoder', StringArg),
+             ('resume', BoolArg)],
+    synopsis='render anaglyph images or movies of many files offscreen')
+
+
+def anaglyph_stats(session, enable=None, frames=None, log=None, log_format='csv'):
+    '''
+    Report or record per-frame anaglyph stage timing.
+
+    Parameters
+    ----------
+    enable : bool
+      Start or stop recording.  Starting again discards earlier frames.
+    frames : int
+      Number of most recent frames kept for the percentiles.
+    log : str
+      File receiving one line per frame in csv or json format.
+    '''
+    c = _anaglyph_camera(session)
+    if frames is not None and frames < 1:
+        raise UserError('Frames must be at least 1, got %d' % frames)
+    if enable is None and (frames is not None or log is not None):
+        enable = True
+
+    if enable is not None and c.timer:
+        c.timer.delete(make_current=True)
+        c.timer = None
+    if enable:
+        from .timing import StereoTimer
+        c.timer = StereoTimer(frames=300 if frames is None else frames, log_path=log, log_format=log_format)
+        c.redraw_needed = True
+        session.logger.info('Anaglyph timing on')
+    elif enable is False:
+        session.logger.info('Anaglyph timing off')
+    elif c.timer is None:
+        session.logger.info('Anaglyph timing is off, use "anaglyph stats true" to record')
+    else:
+        session.logger.info(c.timer.report())
+        pool = c._framebuffer_pool
+        session.logger.info('Framebuffer pool: %d allocations, %.1f Mbytes allocated, %.1f Mbytes held'
+                            % (pool.allocations, pool.bytes_allocated / 2**20, pool.bytes_held / 2**20))
+
+
+anaglyph_stats_desc = CmdDesc(
+    optional=[('enable', BoolArg)],
+    keyword=[('frames', IntArg),
+             ('log', SaveFileNameArg),
+             ('log_format', EnumOf(('csv', 'json')))],
+    synopsis='report or record anaglyph stage timing')
+
+
+def _anaglyph_camera(session):
+    s = getattr(session, 'anaglyph_state', None)
+    if s is None or not s.enabled:
+        raise UserError('Anaglyph camera is not active, use "anaglyph on" first')
+    return s.camera
@@ -0,0 +1,81 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Anaglyph color matrices for red-cyan glasses.
+
+Each method is a pair of 3x3 matrices (left, right) acting on RGB column
+vectors.  The composited color is clip(left @ rgb_left + right @ rgb_right).
+These arrays are uploaded unchanged to the compositor shader, and
+composite_reference() is the NumPy reference for the shader output.
+'''
+
+from numpy import array, float32, uint8, zeros, clip
+
+_luminance = (0.299, 0.587, 0.114)
+_zero = (0, 0, 0)
+
+_matrices = {
+    # Gray on the red channel for the left eye, gray on blue for the right.
+    'true': (
+        (_luminance, _zero, _zero),
+        (_zero, _zero, _luminance),
+    ),
+    # Gray for both eyes, no color but little retinal rivalry.
+    'gray': (
+        (_luminance, _zero, _zero),
+        (_zero, _luminance, _luminance),
+    ),
+    # Plain channel split, same as the red/cyan color mask.
+    'color': (
+        ((1, 0, 0), _zero, _zero),
+        (_zero, (0, 1, 0), (0, 0, 1)),
+    ),
+    # Gray left eye reduces rivalry on saturated reds.
+    'half-color': (
+        (_luminance, _zero, _zero),
+        (_zero, (0, 1, 0), (0, 0, 1)),
+    ),
+    # Red taken from green and blue of the left eye.  The usual gamma 1.5
+    # correction on red is omitted to keep the transform linear.
+    'optimized': (
+        ((0, 0.7, 0.3), _zero, _zero),
+        (_zero, (0, 1, 0), (0, 0, 1)),
+    ),
+    # Dubois least-squares projection for red-cyan filters.
+    'dubois': (
+        ((0.456, 0.500, 0.176),
+         (-0.040, -0.038, -0.016),
+         (-0.015, -0.021, -0.005)),
+        ((-0.043, -0.088, -0.002),
+         (0.378, 0.734, -0.018),
+         (-0.072, -0.113, 1.226)),
+    ),
+}
+
+methods = tuple(_matrices.keys())
+
+
+def anaglyph_matrices(method):
+    '''Return (left, right) 3x3 float32 color matrices for an anaglyph method.'''
+    if method not in _matrices:
+        raise ValueError('Unknown anaglyph color method "%s", expected one of %s'
+                         % (method, ', '.join(methods)))
+    left, right = _matrices[method]
+    return array(left, float32), array(right, float32)
+
+
+def composite_reference(left_rgba, right_rgba, method):
+    '''
+    Combine left and right eye images (h, w, 4) uint8 arrays with the given
+    method the same way the compositor shader does.  Returns (h, w, 4) uint8
+    with alpha 255.
+    '''
+    lm, rm = anaglyph_matrices(method)
+    lrgb = left_rgba[:, :, :3].astype(float32) / 255
+    rrgb = right_rgba[:, :, :3].astype(float32) / 255
+    rgb = clip(lrgb @ lm.T + rrgb @ rm.T, 0, 1)
+    h, w = rgb.shape[:2]
+    rgba = zeros((h, w, 4), uint8)
+    rgba[:, :, :3] = (rgb * 255 + 0.5).astype(uint8)
+    rgba[:, :, 3] = 255
+    return rgba
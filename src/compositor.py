@@ -0,0 +1,154 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Full-screen shader passes used by the anaglyph camera.
+
+The ChimeraX shader only draws textured geometry one texture at a time, so
+combining both eyes in a single pass needs its own small GLSL program.
+'''
+
+from OpenGL import GL
+
+_full_screen_vertex_shader = '''
+#version 330
+uniform vec2 tex_scale;  // Texture coordinate range holding the image
+out vec2 tex_coord;
+void main()
+{
+    // Single triangle covering the viewport, no vertex buffer needed.
+    vec2 p = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    tex_coord = p * tex_scale;
+    gl_Position = vec4(2.0*p - 1.0, 0.0, 1.0);
+}
+'''
+
+_anaglyph_fragment_shader = '''
+#version 330
+uniform sampler2D left_eye;
+uniform sampler2D right_eye;
+uniform mat3 left_matrix;
+uniform mat3 right_matrix;
+in vec2 tex_coord;
+out vec4 frag_color;
+void main()
+{
+    vec3 l = texture(left_eye, tex_coord).rgb;
+    vec3 r = texture(right_eye, tex_coord).rgb;
+    frag_color = vec4(clamp(left_matrix*l + right_matrix*r, 0.0, 1.0), 1.0);
+}
+'''
+
+
+class FullScreenPass:
+    '''GLSL program drawn as one full-viewport triangle.'''
+
+    def __init__(self, fragment_shader, vertex_shader=_full_screen_vertex_shader):
+        self._vertex_shader = vertex_shader
+        self._fragment_shader = fragment_shader
+        self._program = None
+        self._vertex_array = None
+        self._uniforms = {}
+        self._opengl_context = None
+
+    def delete(self, make_current=False):
+        if self._program is None:
+            return
+        if make_current and self._opengl_context is not None:
+            self._opengl_context.make_current()
+        GL.glDeleteProgram(self._program)
+        GL.glDeleteVertexArrays(1, [self._vertex_array])
+        self._program = self._vertex_array = None
+        self._uniforms = {}
+
+    def _use(self, render):
+        if self._program is None:
+            self._program = _compile_program(self._vertex_shader, self._fragment_shader)
+            self._vertex_array = GL.glGenVertexArrays(1)
+            self._opengl_context = render.opengl_context
+        GL.glUseProgram(self._program)
+        # ChimeraX caches the bound program, make it rebind on next draw.
+        render.current_shader_program = None
+
+    def _uniform(self, name):
+        loc = self._uniforms.get(name)
+        if loc is None:
+            self._uniforms[name] = loc = GL.glGetUniformLocation(self._program, name)
+        return loc
+
+    def _draw(self, primitive=GL.GL_TRIANGLES, count=3, depth_test=False):
+        saved = {cap: GL.glIsEnabled(cap) for cap in (GL.GL_DEPTH_TEST, GL.GL_BLEND)}
+        _set_capability(GL.GL_DEPTH_TEST, depth_test)
+        _set_capability(GL.GL_BLEND, False)
+        GL.glBindVertexArray(self._vertex_array)
+        GL.glDrawArrays(primitive, 0, count)
+        GL.glBindVertexArray(0)
+        for cap, enabled in saved.items():
+            _set_capability(cap, enabled)
+
+
+class AnaglyphCompositor(FullScreenPass):
+    '''
+    Combine left and right eye textures in one pass using a pair of 3x3
+    color matrices, see color_matrices.py for the available methods.
+    '''
+
+    def __init__(self, method='dubois'):
+        FullScreenPass.__init__(self, _anaglyph_fragment_shader)
+        self.method = method
+
+    def draw(self, render, left_texture, right_texture, tex_scale=(1, 1)):
+        '''
+        Draw into the current framebuffer and viewport.  The eye images cover
+        texture coordinates 0 to tex_scale.
+        '''
+        from .color_matrices import anaglyph_matrices
+        lm, rm = anaglyph_matrices(self.method)
+        self._use(render)
+        GL.glUniform2f(self._uniform('tex_scale'), *tex_scale)
+        GL.glUniform1i(self._uniform('left_eye'), 0)
+        GL.glUniform1i(self._uniform('right_eye'), 1)
+        # Matrices are row-major numpy arrays, GLSL expects column-major.
+        GL.glUniformMatrix3fv(self._uniform('left_matrix'), 1, GL.GL_TRUE, lm)
+        GL.glUniformMatrix3fv(self._uniform('right_matrix'), 1, GL.GL_TRUE, rm)
+        left_texture.bind_texture(0)
+        right_texture.bind_texture(1)
+        self._draw()
+        right_texture.unbind_texture(1)
+        left_texture.unbind_texture(0)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+
+
+def _compile_program(vertex_source, fragment_source):
+    shaders = []
+    for source, shader_type in ((vertex_source, GL.GL_VERTEX_SHADER),
+                                (fragment_source, GL.GL_FRAGMENT_SHADER)):
+        s = GL.glCreateShader(shader_type)
+        GL.glShaderSource(s, source)
+        GL.glCompileShader(s)
+        if not GL.glGetShaderiv(s, GL.GL_COMPILE_STATUS):
+            log = GL.glGetShaderInfoLog(s)
+            raise RuntimeError('Anaglyph shader compile failed: %s' % _as_text(log))
+        shaders.append(s)
+    p = GL.glCreateProgram()
+    for s in shaders:
+        GL.glAttachShader(p, s)
+    GL.glLinkProgram(p)
+    for s in shaders:
+        GL.glDetachShader(p, s)
+        GL.glDeleteShader(s)
+    if not GL.glGetProgramiv(p, GL.GL_LINK_STATUS):
+        log = GL.glGetProgramInfoLog(p)
+        GL.glDeleteProgram(p)
+        raise RuntimeError('Anaglyph shader link failed: %s' % _as_text(log))
+    return p
+
+
+def _set_capability(cap, enable):
+    if enable:
+        GL.glEnable(cap)
+    else:
+        GL.glDisable(cap)
+
+
+def _as_text(log):
+    return log.decode('utf-8', 'replace') if isinstance(log, bytes) else str(log)
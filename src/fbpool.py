@@ -0,0 +1,128 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Pool of offscreen framebuffers for the anaglyph eye images.
+
+Framebuffers are allocated with sizes rounded up to a size class and images
+are rendered into a lower left sub-viewport of the requested size.  A
+framebuffer too small for the requested size is replaced immediately, so
+images are always rendered at full resolution.  When a smaller size class is
+requested, for instance while dragging the window edge, the larger
+framebuffer keeps being used until the smaller size class has been requested
+continuously for the debounce interval.
+'''
+
+from time import perf_counter
+
+
+class FramebufferPool:
+
+    def __init__(self, granularity=256, debounce=0.25):
+        self.granularity = granularity  # Allocation sizes are multiples of this many pixels
+        self.debounce = debounce        # Seconds a new size class must persist before reallocating
+        self.max_size = None            # Size classes are not rounded up beyond this, usually the maximum texture size
+        self.allocations = 0            # Framebuffers allocated since pool creation
+        self.bytes_allocated = 0        # Bytes allocated since pool creation
+        self.bytes_held = 0             # Bytes in currently allocated framebuffers
+        self._framebuffers = {}         # Map (slot, size class, depth texture) to Framebuffer
+        self._pending = {}              # Map slot to (requested size class, time first requested)
+
+    def framebuffer(self, slot, size, opengl_context, depth_texture=False):
+        '''
+        Return a framebuffer for slot with its viewport set to size.  The
+        pending attribute is true if a larger framebuffer is in use while a
+        smaller size settles, the caller should draw again later in that case
+        so the larger one is released.
+        '''
+        sc = self._size_class(size)
+        key = (slot, sc, depth_texture)
+        fb = self._framebuffers.get(key)
+        if fb is None:
+            current = [fb for k, fb in self._framebuffers.items()
+                       if k[0] == slot and k[2] == depth_texture]
+            if current and _fits(current[0], size) and not self._settled(slot, sc):
+                fb = current[0]
+        if fb is None:
+            self._release(slot)
+            fb = self._allocate(key, opengl_context)
+        if fb is self._framebuffers.get(key):
+            self._pending.pop(slot, None)
+        fb.viewport = (0, 0, size[0], size[1])
+        return fb
+
+    @property
+    def pending(self):
+        return len(self._pending) > 0
+
+    def delete(self):
+        '''Release all framebuffers, even if deleting one of them fails.'''
+        fbs = list(self._framebuffers.values())
+        self._framebuffers.clear()
+        self._pending.clear()
+        self.bytes_held = 0
+        error = None
+        for fb in fbs:
+            try:
+                fb.delete(make_current=True)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def _settled(self, slot, size_class):
+        '''Has the size class been requested for slot for the debounce interval.'''
+        now = perf_counter()
+        psc, since = self._pending.get(slot, (None, now))
+        if psc != size_class:
+            self._pending[slot] = (size_class, now)
+            since = now
+        return now - since >= self.debounce
+
+    def _size_class(self, size):
+        g, m = self.granularity, self.max_size
+        sc = tuple(max(g, g * ((s + g - 1) // g)) for s in size)
+        if m is not None:
+            sc = tuple(max(s, min(c, m)) for s, c in zip(size, sc))
+        return sc
+
+    def _allocate(self, key, opengl_context):
+        slot, (w, h), depth_texture = key
+        fb = self._new_framebuffer(slot, (w, h), opengl_context, depth_texture)
+        self._framebuffers[key] = fb
+        nbytes = _framebuffer_bytes(w, h)
+        self.allocations += 1
+        self.bytes_allocated += nbytes
+        self.bytes_held += nbytes
+        return fb
+
+    def _new_framebuffer(self, slot, size, opengl_context, depth_texture):
+        from chimerax.graphics.opengl import Texture, Framebuffer
+        t = Texture()
+        t.initialize_rgba(size)
+        if depth_texture:
+            dt = Texture()
+            dt.initialize_depth(size, depth_compare_mode=False)
+        else:
+            dt = None
+        return Framebuffer('stereo camera %s' % slot, opengl_context, color_texture=t, depth_texture=dt)
+
+    def _release(self, slot):
+        for key in [k for k in self._framebuffers if k[0] == slot]:
+            fb = self._framebuffers.pop(key)
+            self.bytes_held -= _framebuffer_bytes(*key[1])
+            fb.delete()
+
+
+def texture_scale(fb):
+    '''Texture coordinate range covered by the framebuffer viewport.'''
+    x, y, w, h = fb.viewport
+    return (w / fb.width, h / fb.height)
+
+
+def _fits(fb, size):
+    w, h = size
+    return fb.width >= w and fb.height >= h
+
+
+def _framebuffer_bytes(w, h):
+    return 8 * w * h  # 4 bytes RGBA color and 4 bytes depth per pixel
@@ -0,0 +1,133 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Adjust the anaglyph eye render resolution to hold a target frame rate.
+
+Eye images are rendered at a fraction of the window size and upscaled when
+composited.  The frame rate is the one the camera rendering alone allows,
+from the time between the first eye render target and the end of the
+composite.  CPU time is measured with perf_counter and GPU time with
+GL_TIMESTAMP queries read back a frame or more later without waiting, so
+idle time between redraws does not count.  The fraction moves in fixed
+steps and only after several frames outside the target, and it only steps
+up if the frame rate expected at the higher scale, assuming cost grows with
+pixel count, still meets the target.  So eye framebuffers are not
+reallocated every frame.  When no frame has been drawn for a while the
+scale snaps back to full resolution and one more frame is drawn.
+'''
+
+from time import perf_counter
+from collections import deque
+from OpenGL import GL
+
+
+class AdaptiveRenderScale:
+
+    def __init__(self, session, camera, target_fps=30, min_scale=0.25,
+                 step=0.125, tolerance=0.15, settle_frames=10, idle_time=0.5):
+        self.camera = camera
+        self.target_fps = target_fps
+        self.min_scale = min_scale
+        self.step = step                    # Scale change per adjustment
+        self.tolerance = tolerance          # Fraction below target fps before stepping down
+        self.settle_frames = settle_frames  # Frames outside target before adjusting
+        self.idle_time = idle_time          # Seconds without drawing before full resolution
+        self.fps = None                     # Smoothed frame rate allowed by rendering time
+        self._last_frame_time = None
+        self._frame_start = None            # (CPU time, GPU timestamp query) of frame being drawn
+        self._waiting = deque()             # (render scale, CPU ms, start query, end query)
+        self._free_queries = []
+        self._opengl_context = None
+        self._slow_frames = self._fast_frames = 0
+        self._session = session
+        self._handler = session.triggers.add_handler('new frame', self._check_idle)
+
+    def delete(self, make_current=False):
+        if self._handler is not None:
+            self._session.triggers.remove_handler(self._handler)
+            self._handler = None
+        queries = list(self._free_queries)
+        for scale, cpu_ms, q0, q1 in self._waiting:
+            queries.extend((q0, q1))
+        if self._frame_start is not None:
+            queries.append(self._frame_start[1])
+        self._free_queries, self._frame_start = [], None
+        self._waiting.clear()
+        if queries:
+            if make_current and self._opengl_context is not None:
+                self._opengl_context.make_current()
+            GL.glDeleteQueries(len(queries), queries)
+
+    def frame_started(self, render):
+        '''Called by the camera before rendering the first view of a frame.'''
+        self._opengl_context = render.opengl_context
+        if self._frame_start is not None:
+            self._free_queries.append(self._frame_start[1])  # Last frame was not composited
+        q = self._query()
+        GL.glQueryCounter(q, GL.GL_TIMESTAMP)
+        self._frame_start = (perf_counter(), q)
+
+    def frame_drawn(self):
+        '''
+        Called by the camera once the frame is composited.  Frames not started
+        with frame_started(), drawn where the scale does not apply, are not measured.
+        '''
+        t = perf_counter()
+        self._last_frame_time = t
+        if self._frame_start is None:
+            return
+        t0, q0 = self._frame_start
+        self._frame_start = None
+        q1 = self._query()
+        GL.glQueryCounter(q1, GL.GL_TIMESTAMP)
+        self._waiting.append((self.camera.render_scale, 1000 * (t - t0), q0, q1))
+        self._collect_frame_times()
+
+    def _query(self):
+        return self._free_queries.pop() if self._free_queries else GL.glGenQueries(1)[0]
+
+    def _collect_frame_times(self):
+        while self._waiting:
+            scale, cpu_ms, q0, q1 = self._waiting[0]
+            if not GL.glGetQueryObjectiv(q1, GL.GL_QUERY_RESULT_AVAILABLE):
+                return  # Queries complete in order, later frames are not ready either
+            self._waiting.popleft()
+            ns = (int(GL.glGetQueryObjectui64v(q1, GL.GL_QUERY_RESULT))
+                  - int(GL.glGetQueryObjectui64v(q0, GL.GL_QUERY_RESULT)))
+            self._free_queries.extend((q0, q1))
+            if scale == self.camera.render_scale:  # Skip frames drawn before a scale change
+                self._frame_time(max(cpu_ms, ns * 1e-6))
+
+    def _frame_time(self, ms):
+        fps = 1000 / max(ms, 1e-3)
+        self.fps = fps if self.fps is None else 0.8 * self.fps + 0.2 * fps
+
+        s = self.camera.render_scale
+        up = min(1.0, s + self.step)
+        if self.fps < (1 - self.tolerance) * self.target_fps:
+            self._slow_frames += 1
+            self._fast_frames = 0
+        elif up > s and self.fps * (s / up) ** 2 >= self.target_fps:
+            # Pixel count grows with the square of the scale.
+            self._fast_frames += 1
+            self._slow_frames = 0
+        else:
+            self._slow_frames = self._fast_frames = 0
+
+        if self._slow_frames >= self.settle_frames and s > self.min_scale:
+            self._set_scale(max(self.min_scale, s - self.step))
+        elif self._fast_frames >= self.settle_frames:
+            self._set_scale(up)
+
+    def _set_scale(self, scale):
+        self.camera.render_scale = scale
+        self._slow_frames = self._fast_frames = 0
+        self.fps = None  # Old measurements were at a different resolution
+
+    def _check_idle(self, trigger_name, data):
+        last = self._last_frame_time
+        if last is None or self.camera.render_scale == 1:
+            return
+        if perf_counter() - last > self.idle_time:
+            self._set_scale(1.0)
+            self.camera.redraw_needed = True
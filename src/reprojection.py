@@ -0,0 +1,244 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Synthesize the second stereo eye from the color and depth of the first.
+
+Each source pixel is unprojected with its depth and drawn as a point in the
+other eye, the depth test keeps the nearest surface.  Background pixels, at
+depth 1, are not drawn.  A pixel no point lands on is background if the
+source eye sees background where the far plane point of that pixel projects.
+Other uncovered pixels are disocclusions and are filled by stretching the
+farther of the nearest covered or background pixels along the row, which is
+where the background or a farther surface reappears.
+'''
+
+from OpenGL import GL
+from .compositor import FullScreenPass
+
+_scatter_vertex_shader = '''
+#version 330
+uniform sampler2D source_color;
+uniform sampler2D source_depth;
+uniform ivec2 size;  // Image size, may be smaller than the textures
+uniform mat4 reprojection;
+out vec3 color;
+void main()
+{
+    ivec2 p = ivec2(gl_VertexID % size.x, gl_VertexID / size.x);
+    float d = texelFetch(source_depth, p, 0).r;
+    color = texelFetch(source_color, p, 0).rgb;
+    if (d >= 1.0) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);  // Background, outside the clip volume
+        return;
+    }
+    vec3 ndc = vec3((vec2(p) + 0.5) / vec2(size), d) * 2.0 - 1.0;
+    gl_Position = reprojection * vec4(ndc, 1.0);
+}
+'''
+
+_scatter_fragment_shader = '''
+#version 330
+in vec3 color;
+out vec4 frag_color;
+void main()
+{
+    frag_color = vec4(color, 1.0);  // Alpha 1 marks covered pixels
+}
+'''
+
+_reprojection_composite_shader = '''
+#version 330
+uniform sampler2D source_color;
+uniform sampler2D source_depth;
+uniform sampler2D warped_color;
+uniform sampler2D warped_depth;
+uniform mat4 inverse_reprojection;  // Target eye NDC to source eye clip coordinates
+uniform bool source_is_left;
+uniform int max_gap;
+uniform ivec2 image_size;
+uniform mat3 left_matrix;
+uniform mat3 right_matrix;
+in vec2 tex_coord;
+out vec4 frag_color;
+
+bool background(ivec2 p, out vec3 color)
+{
+    // Look up where the source eye sees the far plane point of target pixel p.
+    vec2 ndc = (vec2(p) + 0.5) / vec2(image_size) * 2.0 - 1.0;
+    vec4 s = inverse_reprojection * vec4(ndc, 1.0, 1.0);
+    ivec2 q = clamp(ivec2((s.xy / s.w * 0.5 + 0.5) * vec2(image_size)), ivec2(0), image_size - 1);
+    color = texelFetch(source_color, q, 0).rgb;
+    return texelFetch(source_depth, q, 0).r >= 1.0;
+}
+
+void consider(ivec2 q, inout bool found, inout vec3 best, inout float best_depth)
+{
+    vec4 c = texelFetch(warped_color, q, 0);
+    vec3 color;
+    float d;
+    if (c.a > 0.0) {
+        color = c.rgb;
+        d = texelFetch(warped_depth, q, 0).r;
+    } else if (background(q, color))
+        d = 1.0;
+    else
+        return;
+    found = true;
+    if (d > best_depth) {
+        best = color;
+        best_depth = d;
+    }
+}
+
+vec3 warped(vec2 uv)
+{
+    ivec2 size = image_size;
+    ivec2 p = min(ivec2(uv * vec2(textureSize(warped_color, 0))), size - 1);
+    vec4 c = texelFetch(warped_color, p, 0);
+    if (c.a > 0.0)
+        return c.rgb;
+    vec3 best;
+    if (background(p, best))
+        return best;
+    best = texture(source_color, uv).rgb;
+    float best_depth = -1.0;
+    bool found_left = false, found_right = false;
+    for (int i = 1; i <= max_gap && !(found_left && found_right); ++i) {
+        if (!found_left && p.x - i >= 0)
+            consider(ivec2(p.x - i, p.y), found_left, best, best_depth);
+        if (!found_right && p.x + i < size.x)
+            consider(ivec2(p.x + i, p.y), found_right, best, best_depth);
+    }
+    return best;
+}
+
+void main()
+{
+    vec3 s = texture(source_color, tex_coord).rgb;
+    vec3 w = warped(tex_coord);
+    vec3 l = source_is_left ? s : w;
+    vec3 r = source_is_left ? w : s;
+    frag_color = vec4(clamp(left_matrix*l + right_matrix*r, 0.0, 1.0), 1.0);
+}
+'''
+
+
+class DepthReprojection(FullScreenPass):
+    '''Draw every foreground source eye pixel as a point at its position in the other eye.'''
+
+    def __init__(self):
+        FullScreenPass.__init__(self, _scatter_fragment_shader,
+                                vertex_shader=_scatter_vertex_shader)
+
+    def draw(self, render, color_texture, depth_texture, reprojection, image_size):
+        '''
+        Draw into the current framebuffer which should have a depth buffer.
+        The source image occupies the lower left image_size of its textures.
+        '''
+        self._use(render)
+        GL.glUniform2i(self._uniform('size'), *image_size)
+        GL.glUniform1i(self._uniform('source_color'), 0)
+        GL.glUniform1i(self._uniform('source_depth'), 1)
+        GL.glUniformMatrix4fv(self._uniform('reprojection'), 1, GL.GL_TRUE, reprojection)
+        color_texture.bind_texture(0)
+        depth_texture.bind_texture(1)
+        w, h = image_size
+        self._draw(GL.GL_POINTS, w * h, depth_test=True)
+        depth_texture.unbind_texture(1)
+        color_texture.unbind_texture(0)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+
+
+class ReprojectionCompositor(FullScreenPass):
+    '''
+    Fill disocclusions in the reprojected eye and combine it with the source
+    eye using the anaglyph color matrices, all in one pass.
+    '''
+
+    def __init__(self, method='dubois', max_gap=64):
+        FullScreenPass.__init__(self, _reprojection_composite_shader)
+        self.method = method
+        self.max_gap = max_gap  # Widest hole in pixels filled by stretching
+
+    def draw(self, render, source_color, source_depth, warped_color, warped_depth,
+             reprojection, source_is_left, image_size):
+        '''
+        Draw into the current framebuffer and viewport.  The reprojection
+        matrix is the one used to draw the warped eye.
+        '''
+        from numpy import float32
+        from numpy.linalg import inv
+        from .color_matrices import anaglyph_matrices
+        lm, rm = anaglyph_matrices(self.method)
+        self._use(render)
+        w, h = image_size
+        tw, th = source_color.size
+        GL.glUniform2f(self._uniform('tex_scale'), w / tw, h / th)
+        GL.glUniform2i(self._uniform('image_size'), w, h)
+        GL.glUniform1i(self._uniform('source_color'), 0)
+        GL.glUniform1i(self._uniform('warped_color'), 1)
+        GL.glUniform1i(self._uniform('warped_depth'), 2)
+        GL.glUniform1i(self._uniform('source_depth'), 3)
+        GL.glUniformMatrix4fv(self._uniform('inverse_reprojection'), 1, GL.GL_TRUE,
+                              inv(reprojection).astype(float32))
+        GL.glUniform1i(self._uniform('source_is_left'), int(source_is_left))
+        GL.glUniform1i(self._uniform('max_gap'), self.max_gap)
+        GL.glUniformMatrix3fv(self._uniform('left_matrix'), 1, GL.GL_TRUE, lm)
+        GL.glUniformMatrix3fv(self._uniform('right_matrix'), 1, GL.GL_TRUE, rm)
+        textures = (source_color, warped_color, warped_depth, source_depth)
+        for unit, t in enumerate(textures):
+            t.bind_texture(unit)
+        self._draw()
+        for unit, t in enumerate(textures):
+            t.unbind_texture(unit)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+
+
+def reprojection_matrix(projection, source_position, target_position):
+    '''
+    Return the 4x4 matrix taking source eye normalized device coordinates to
+    target eye clip coordinates.  Positions are camera to scene Place transforms.
+    '''
+    from numpy import array, float32, float64, identity
+    from numpy.linalg import inv
+    p = array(projection, float64).T  # ChimeraX projection matrices are column-major
+    m = identity(4)
+    m[:3, :] = (target_position.inverse() * source_position).matrix
+    return (p @ m @ inv(p)).astype(float32)
+
+
+def psnr(image1, image2):
+    '''Peak signal-to-noise ratio in dB of two uint8 RGB(A) images, RGB only.'''
+    from numpy import float64, mean, inf
+    from math import log10
+    d = image1[:, :, :3].astype(float64) - image2[:, :, :3].astype(float64)
+    mse = mean(d * d)
+    if mse == 0:
+        return inf
+    return 10 * log10(255 * 255 / mse)
+
+
+def reprojection_psnr(view, width=None, height=None):
+    '''
+    Render the anaglyph image with the true second eye and with the
+    reprojected second eye and return the PSNR of the two.  The camera of
+    the view must be an AnaglyphCamera.  Images larger than its tile size
+    are not reprojected, both are drawn in shader mode.
+    '''
+    c = view.camera
+    mode = c.mode
+    try:
+        c.mode = 'shader'
+        reference = _image_rgba(view, width, height)
+        c.mode = 'reproject'
+        image = _image_rgba(view, width, height)
+    finally:
+        c.mode = mode
+    return psnr(reference, image)
+
+
+def _image_rgba(view, width, height):
+    image = view.image_rgba(width, height)
+    if not view.camera.frame_complete:
+        image = view.image_rgba(width, height)  # Tile grid changed, draw all tiles
+    return image
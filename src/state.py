@@ -0,0 +1,106 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Anaglyph on/off state of a session.
+
+The anaglyph camera module is only imported the first time anaglyph is
+turned on.  Turning it off restores the previous camera but keeps the
+anaglyph camera, so turning it on again reuses its OpenGL resources.
+'''
+
+from chimerax.core.state import StateManager
+
+modes = ('direct', 'framebuffer', 'shader', 'reproject')
+
+_tag = 'anaglyph_state'
+
+
+def anaglyph_state(session):
+    '''Return the session AnaglyphState, creating it if needed.'''
+    s = getattr(session, _tag, None)
+    if s is None:
+        s = AnaglyphState(session)
+        session.add_state_manager(_tag, s)
+    return s
+
+
+class AnaglyphState(StateManager):
+    '''Anaglyph camera parameters, saved in sessions.'''
+
+    version = 1
+
+    def __init__(self, session):
+        self._session = session
+        # Keyword arguments for AnaglyphCamera, also its attribute names.
+        self.parameters = {
+            'eye_separation_scene': 0.9,
+            'convergence': 0,
+            'swap_eyes': False,
+            'mode': 'direct',
+            'color_method': 'dubois',
+            'tile_size': None,
+        }
+        self.camera = None           # AnaglyphCamera, kept while off to reuse GL resources
+        self.previous_camera = None  # Camera restored when turned off
+
+    @property
+    def enabled(self):
+        return self.camera is not None and self._session.main_view.camera is self.camera
+
+    def on(self, **parameters):
+        '''Show the anaglyph camera, updating the given parameters.'''
+        self.parameters.update(parameters)
+        c = self.camera
+        if c is None:
+            from .camera import AnaglyphCamera
+            c = self.camera = AnaglyphCamera(**self.parameters)
+        else:
+            for attr, value in self.parameters.items():
+                setattr(c, attr, value)
+        view = self._session.main_view
+        if view.camera is not c:
+            self.previous_camera = view.camera
+            c.position = view.camera.position  # Preserve current camera position
+            view.camera = c
+        c.redraw_needed = True
+        return c
+
+    def off(self, release=False):
+        '''
+        Restore the camera in use before anaglyph was turned on at the current
+        view position.  If release is true also free the anaglyph GL resources.
+        '''
+        c = self.camera
+        view = self._session.main_view
+        if c is not None and view.camera is c:
+            p = self.previous_camera
+            if p is None:
+                from chimerax.graphics import MonoCamera
+                p = MonoCamera()
+            p.position = c.position
+            view.camera = p
+        self.previous_camera = None
+        if release and c is not None:
+            self.camera = None
+            c.delete()
+
+    def take_snapshot(self, session, flags):
+        return {'version': self.version,
+                'parameters': dict(self.parameters),
+                'enabled': self.enabled}
+
+    @staticmethod
+    def restore_snapshot(session, data):
+        s = AnaglyphState(session)
+        s.parameters.update(data['parameters'])
+        if data['enabled']:
+            # The view restores its own camera, switch once it is done.
+            def enable(trigger_name, trigger_data, s=s):
+                s.on()
+                from chimerax.core.triggerset import DEREGISTER
+                return DEREGISTER
+            session.triggers.add_handler('end restore session', enable)
+        return s
+
+    def reset_state(self, session):
+        self.off(release=True)
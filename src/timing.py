@@ -0,0 +1,141 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Per-frame timing of the anaglyph camera stages.
+
+Stages are the left eye, right eye and composite passes.  CPU time is
+measured with perf_counter at stage boundaries.  GPU time uses OpenGL
+GL_TIME_ELAPSED queries whose results are collected one or more frames
+later without waiting, so timing does not stall the pipeline.  When timing
+is off the camera holds no timer and pays only an attribute test per stage.
+'''
+
+from time import perf_counter
+from collections import deque
+from OpenGL import GL
+
+stages = ('left', 'right', 'composite')
+
+
+class StereoTimer:
+
+    def __init__(self, frames=300, log_path=None, log_format='csv'):
+        self.frames = deque(maxlen=frames)  # Per frame dict of stage times in milliseconds
+        self._stage = None
+        self._stage_start = None
+        self._cpu = {}                      # Stage CPU times for the frame being drawn
+        self._queries = []                  # (stage, query id) for the frame being drawn
+        self._waiting = deque()             # (frame record, queries) awaiting GPU results
+        self._free_queries = []
+        self._last_allocations = None
+        self._opengl_context = None
+        self._log = None
+        self._log_format = log_format
+        if log_path is not None:
+            self._open_log(log_path, log_format)
+
+    def delete(self, make_current=False):
+        if make_current and self._opengl_context is not None:
+            self._opengl_context.make_current()
+        queries = self._free_queries + [q for s, q in self._queries]
+        for record, qs in self._waiting:
+            queries.extend(q for s, q in qs)
+        if queries:
+            GL.glDeleteQueries(len(queries), queries)
+        self._free_queries, self._queries = [], []
+        self._waiting.clear()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def start_stage(self, stage, render):
+        '''End the current stage, if any, and start timing a new one.'''
+        self._end_stage()
+        self._opengl_context = render.opengl_context
+        self._stage = stage
+        self._stage_start = perf_counter()
+        q = self._free_queries.pop() if self._free_queries else GL.glGenQueries(1)[0]
+        GL.glBeginQuery(GL.GL_TIME_ELAPSED, q)
+        self._queries.append((stage, q))
+
+    def end_frame(self, framebuffer_pool=None):
+        '''Finish timing a frame and collect GPU results of earlier frames.'''
+        self._end_stage()
+        record = {'time': perf_counter()}
+        for stage, t in self._cpu.items():
+            record[stage + ' cpu'] = t
+        if framebuffer_pool is not None:
+            a = framebuffer_pool.allocations
+            last = self._last_allocations
+            record['allocations'] = 0 if last is None else a - last
+            record['bytes held'] = framebuffer_pool.bytes_held
+            self._last_allocations = a
+        self._waiting.append((record, self._queries))
+        self._cpu, self._queries = {}, []
+        self._collect_gpu_times()
+
+    def percentiles(self):
+        '''Return dict mapping measurement name to (p50, p95, max).'''
+        from numpy import array, percentile
+        values = {}
+        for record in self.frames:
+            for name, v in record.items():
+                if name != 'time' and name != 'bytes held':
+                    values.setdefault(name, []).append(v)
+        result = {}
+        for name, v in values.items():
+            a = array(v)
+            result[name] = (percentile(a, 50), percentile(a, 95), a.max())
+        return result
+
+    def report(self):
+        '''Text summary of stage times for the log.'''
+        p = self.percentiles()
+        lines = ['Anaglyph timing over %d frames, milliseconds p50 / p95 / max' % len(self.frames)]
+        for stage in stages:
+            for kind in ('cpu', 'gpu'):
+                name = '%s %s' % (stage, kind)
+                if name in p:
+                    lines.append('  %-14s %8.2f %8.2f %8.2f' % ((name,) + tuple(p[name])))
+        if self.frames and 'allocations' in self.frames[-1]:
+            allocs = sum(r.get('allocations', 0) for r in self.frames)
+            held = self.frames[-1]['bytes held']
+            lines.append('  framebuffer allocations %d, %.1f Mbytes held' % (allocs, held / 2**20))
+        return '\n'.join(lines)
+
+    def _end_stage(self):
+        if self._stage is None:
+            return
+        GL.glEndQuery(GL.GL_TIME_ELAPSED)
+        t = 1000 * (perf_counter() - self._stage_start)
+        self._cpu[self._stage] = self._cpu.get(self._stage, 0) + t  # Tiles add up
+        self._stage = None
+
+    def _collect_gpu_times(self):
+        while self._waiting:
+            record, queries = self._waiting[0]
+            if queries and not GL.glGetQueryObjectiv(queries[-1][1], GL.GL_QUERY_RESULT_AVAILABLE):
+                return  # Queries complete in order, later frames are not ready either
+            self._waiting.popleft()
+            for stage, q in queries:
+                ns = GL.glGetQueryObjectui64v(q, GL.GL_QUERY_RESULT)
+                name = stage + ' gpu'
+                record[name] = record.get(name, 0) + float(ns) * 1e-6
+                self._free_queries.append(q)
+            self.frames.append(record)
+            if self._log:
+                self._write_log(record)
+
+    def _open_log(self, path, log_format):
+        self._log = open(path, 'w')
+        if log_format == 'csv':
+            self._columns = (['time'] + ['%s %s' % (s, k) for s in stages for k in ('cpu', 'gpu')]
+                             + ['allocations', 'bytes held'])
+            self._log.write(','.join(c.replace(' ', '_') for c in self._columns) + '\n')
+
+    def _write_log(self, record):
+        if self._log_format == 'csv':
+            self._log.write(','.join(str(record.get(c, '')) for c in self._columns) + '\n')
+        else:
+            import json
+            self._log.write(json.dumps(record) + '\n')
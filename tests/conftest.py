@@ -0,0 +1,51 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+'''
+Tests for the parts of the bundle that need no ChimeraX or OpenGL context.
+
+The bundle package __init__ imports ChimeraX, so the source directory is
+made importable as a bare "anaglyph" package whose modules are loaded on
+demand.  Tests using the offscreen_session fixture draw with OpenGL and are
+skipped unless run with the ChimeraX Python and offscreen rendering works,
+for instance
+
+    chimerax -m pytest tests
+'''
+
+import os
+import sys
+import types
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+
+if 'anaglyph' not in sys.modules:
+    package = types.ModuleType('anaglyph')
+    package.__path__ = [os.path.join(root, 'src')]
+    sys.modules['anaglyph'] = package
+
+
+def load_script(name):
+    '''Import a script from the benchmarks directory.'''
+    import importlib.util
+    path = os.path.join(root, 'benchmarks', name + '.py')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def offscreen_session():
+    '''ChimeraX session with offscreen OpenGL rendering.'''
+    pytest.importorskip('chimerax.core')
+    try:
+        from chimerax.core.__main__ import init
+        session = init(['ChimeraX', '--nogui', '--offscreen', '--silent'], event_loop=False)
+        session.ui.initialize_offscreen_rendering()
+    except Exception as e:
+        pytest.skip('No ChimeraX offscreen rendering: %s' % e)
+    if session.main_view.render is None:
+        pytest.skip('No ChimeraX offscreen rendering')
+    return session
@@ -0,0 +1,56 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from anaglyph.color_matrices import methods, anaglyph_matrices, composite_reference
+
+
+def _image(rgb, shape=(2, 3)):
+    a = numpy.zeros(shape + (4,), numpy.uint8)
+    a[:, :, :3] = rgb
+    a[:, :, 3] = 255
+    return a
+
+
+def test_matrix_shapes():
+    for method in methods:
+        lm, rm = anaglyph_matrices(method)
+        assert lm.shape == rm.shape == (3, 3)
+        assert lm.dtype == rm.dtype == numpy.float32
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        anaglyph_matrices('green-magenta')
+
+
+def test_color_is_channel_split():
+    out = composite_reference(_image((255, 0, 0)), _image((0, 0, 255)), 'color')
+    assert (out[:, :, :3] == (255, 0, 255)).all()
+    out = composite_reference(_image((200, 100, 50)), _image((10, 20, 30)), 'color')
+    assert (out[:, :, :3] == (200, 20, 30)).all()
+    assert (out[:, :, 3] == 255).all()
+
+
+def test_black_stays_black():
+    black = _image((0, 0, 0))
+    for method in methods:
+        assert (composite_reference(black, black, method)[:, :, :3] == 0).all()
+
+
+def test_dubois_sample_pixels():
+    black, red, white = _image((0, 0, 0)), _image((255, 0, 0)), _image((255, 255, 255))
+    # Red left eye: first column of the left matrix, 0.456 * 255 rounds to 116,
+    # negative green and blue clip to 0.
+    out = composite_reference(red, black, 'dubois')
+    assert tuple(out[0, 0]) == (116, 0, 0, 255)
+    # White right eye: right matrix row sums -0.133, 1.094, 1.041 clip to 0, 1, 1.
+    out = composite_reference(black, white, 'dubois')
+    assert tuple(out[0, 0]) == (0, 255, 255, 255)
+
+
+def test_gray_uses_luminance():
+    out = composite_reference(_image((100, 100, 100)), _image((100, 100, 100)), 'gray')
+    assert (out[:, :, :3] == 100).all()
@@ -0,0 +1,39 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+import json
+from conftest import load_script
+
+compare = load_script('compare')
+
+
+def _report(fps, p95, commit='abc'):
+    return {'meta': {'commit': commit},
+            'results': [{'scene': 'atoms', 'size': 1000, 'camera': 'anaglyph shader',
+                         'width': 800, 'height': 600, 'fps': fps,
+                         'latency_ms': {'p50': p95, 'p95': p95, 'max': p95}}]}
+
+
+def test_no_regression_within_threshold():
+    assert compare.compare(_report(95, 10.5), _report(100, 10), 0.1) == []
+
+
+def test_fps_and_latency_regressions():
+    r = compare.compare(_report(80, 12), _report(100, 10), 0.1)
+    assert [measure for key, measure, old, new in r] == ['fps', 'p95 ms']
+    assert r[0][0] == ('atoms', 1000, 'anaglyph shader', 800, 600)
+
+
+def test_cases_missing_from_baseline_are_ignored():
+    baseline = _report(100, 10)
+    baseline['results'][0]['camera'] = 'mono'
+    assert compare.compare(_report(10, 100), baseline, 0.1) == []
+
+
+def test_exit_status(tmp_path, capsys):
+    new, old = tmp_path / 'new.json', tmp_path / 'old.json'
+    old.write_text(json.dumps(_report(100, 10)))
+    new.write_text(json.dumps(_report(100, 10)))
+    assert compare.main([str(new), str(old)]) == 0
+    new.write_text(json.dumps(_report(50, 10)))
+    assert compare.main([str(new), str(old), '--threshold', '0.2']) == 1
+    assert '1 regressions' in capsys.readouterr().out
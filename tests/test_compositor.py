@@ -0,0 +1,44 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+
+def _read_rgba(width, height):
+    from OpenGL import GL
+    data = GL.glReadPixels(0, 0, width, height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+    return numpy.frombuffer(bytes(data), numpy.uint8).reshape(height, width, 4)
+
+
+def test_shader_matches_reference(offscreen_session):
+    from chimerax.graphics.opengl import Texture, Framebuffer
+    from anaglyph.compositor import AnaglyphCompositor
+    from anaglyph.color_matrices import methods, composite_reference
+    r = offscreen_session.main_view.render
+    r.make_current()
+    rng = numpy.random.default_rng(1)
+    h, w = 16, 24
+    left = rng.integers(0, 256, (h, w, 4), dtype=numpy.uint8)
+    right = rng.integers(0, 256, (h, w, 4), dtype=numpy.uint8)
+    # Texture and framebuffer rows both start at the bottom, so no flip is needed.
+    lt, rt = Texture(left), Texture(right)
+    fb = Framebuffer('compositor test', r.opengl_context, w, h)
+    c = AnaglyphCompositor()
+    try:
+        for method in methods:
+            c.method = method
+            r.push_framebuffer(fb)
+            try:
+                c.draw(r, lt, rt)
+                rgba = _read_rgba(w, h)
+            finally:
+                r.pop_framebuffer()
+            expected = composite_reference(left, right, method)
+            # Allow one step of rounding difference between GPU and NumPy.
+            assert abs(rgba.astype(int) - expected.astype(int)).max() <= 1, method
+    finally:
+        c.delete()
+        lt.delete_texture()
+        rt.delete_texture()
+        fb.delete()
@@ -0,0 +1,105 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+import pytest
+
+from anaglyph import fbpool
+from anaglyph.fbpool import FramebufferPool, texture_scale
+
+
+class _Framebuffer:
+
+    def __init__(self, size):
+        self.width, self.height = size
+        self.viewport = (0, 0, self.width, self.height)
+        self.deleted = False
+
+    def delete(self, make_current=False):
+        self.deleted = True
+
+
+class _Pool(FramebufferPool):
+    '''Pool handing out plain size records instead of OpenGL framebuffers.'''
+
+    def _new_framebuffer(self, slot, size, opengl_context, depth_texture):
+        return _Framebuffer(size)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(fbpool, 'perf_counter', lambda: now[0])
+    return now
+
+
+def test_size_classes():
+    p = FramebufferPool(granularity=256)
+    assert p._size_class((1, 1)) == (256, 256)
+    assert p._size_class((256, 257)) == (256, 512)
+    assert p._size_class((1900, 1200)) == (2048, 1280)
+    p.max_size = 2000
+    assert p._size_class((1900, 1200)) == (2000, 1280)
+    assert p._size_class((2100, 100)) == (2100, 256)  # Never below the requested size
+
+
+def test_same_size_class_reuses_framebuffer(clock):
+    p = _Pool()
+    fb = p.framebuffer('left', (1000, 700), None)
+    assert (fb.width, fb.height) == (1024, 768)
+    assert p.framebuffer('left', (1010, 760), None) is fb
+    assert fb.viewport == (0, 0, 1010, 760)
+    assert texture_scale(fb) == (1010 / 1024, 760 / 768)
+    assert p.allocations == 1 and not p.pending
+
+
+def test_slots_and_depth_are_separate(clock):
+    p = _Pool()
+    left = p.framebuffer('left', (500, 500), None)
+    right = p.framebuffer('right', (500, 500), None)
+    assert left is not right
+    assert p.framebuffer('left', (500, 500), None) is left
+    assert p.bytes_held == 2 * 8 * 512 * 512
+
+
+def test_shrink_is_debounced(clock):
+    p = _Pool(debounce=0.25)
+    big = p.framebuffer('left', (1500, 1000), None)
+    fb = p.framebuffer('left', (700, 500), None)
+    assert fb is big and p.pending
+    assert fb.viewport == (0, 0, 700, 500)
+    clock[0] += 0.1
+    assert p.framebuffer('left', (700, 500), None) is big
+    clock[0] += 0.2
+    small = p.framebuffer('left', (700, 500), None)
+    assert small is not big and big.deleted and not p.pending
+    assert (small.width, small.height) == (768, 512)
+    assert p.allocations == 2
+    assert p.bytes_held == 8 * 768 * 512
+
+
+def test_delete_releases_everything(clock):
+    p = _Pool()
+    fbs = [p.framebuffer(slot, (300, 300), None) for slot in ('left', 'right')]
+    p.delete()
+    assert all(fb.deleted for fb in fbs)
+    assert p.bytes_held == 0
+    assert p.framebuffer('left', (300, 300), None) is not fbs[0]
+
+
+def test_growth_reallocates_immediately(clock):
+    p = _Pool(debounce=0.25)
+    small = p.framebuffer('left', (1536, 1024), None)
+    fb = p.framebuffer('left', (1920, 1080), None)
+    assert fb is not small and small.deleted
+    assert (fb.width, fb.height) == (2048, 1280)
+    assert fb.viewport == (0, 0, 1920, 1080)
+    assert not p.pending
+
+
+def test_larger_framebuffer_reused_while_shrink_pending(clock):
+    p = _Pool(debounce=0.25)
+    big = p.framebuffer('left', (2000, 1200), None)
+    p.framebuffer('left', (1000, 600), None)
+    clock[0] += 0.1
+    # Growing back before the shrink settled keeps the big framebuffer.
+    assert p.framebuffer('left', (1900, 1100), None) is big
+    assert not p.pending and p.allocations == 1
@@ -0,0 +1,87 @@
+# vim: set expandtab shiftwidth=4 softtabstop=4:
+
+import math
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL')  # Imported by the module, no context is needed
+
+from anaglyph.reprojection import psnr, reprojection_psnr
+
+
+def _image(value, shape=(4, 5)):
+    a = numpy.full(shape + (4,), value, numpy.uint8)
+    a[:, :, 3] = 255
+    return a
+
+
+def test_psnr_identical_is_infinite():
+    assert psnr(_image(7), _image(7)) == math.inf
+
+
+def test_psnr_ignores_alpha():
+    a, b = _image(7), _image(7)
+    b[:, :, 3] = 0
+    assert psnr(a, b) == math.inf
+
+
+def test_psnr_known_values():
+    assert psnr(_image(0), _image(255)) == pytest.approx(0)
+    assert psnr(_image(10), _image(11)) == pytest.approx(10 * math.log10(255 ** 2))
+    b = _image(10)
+    b[0, 0, 0] = 20  # One channel of one pixel off by 10, mean square error 100 / 60
+    assert psnr(_image(10), b) == pytest.approx(10 * math.log10(255 ** 2 * 60 / 100))
+
+
+class _Camera:
+    mode = 'direct'
+    frame_complete = True
+
+
+class _View:
+    '''Returns a fixed image for each camera mode and records the modes drawn.'''
+
+    def __init__(self, images):
+        self.camera = _Camera()
+        self.images = images
+        self.drawn = []
+
+    def image_rgba(self, width, height):
+        self.drawn.append((self.camera.mode, width, height))
+        return self.images[self.camera.mode]
+
+
+def test_reprojection_psnr_compares_shader_and_reproject():
+    v = _View({'shader': _image(10), 'reproject': _image(11)})
+    assert reprojection_psnr(v, 5, 4) == pytest.approx(10 * math.log10(255 ** 2))
+    assert v.drawn == [('shader', 5, 4), ('reproject', 5, 4)]
+    assert v.camera.mode == 'direct'
+
+
+def test_reprojection_psnr_draws_again_when_tiles_change():
+    v = _View({'shader': _image(10), 'reproject': _image(10)})
+    v.camera.frame_complete = False
+    assert reprojection_psnr(v) == math.inf
+    assert [mode for mode, w, h in v.drawn] == ['shader', 'shader', 'reproject', 'reproject']
+
+
+def test_reprojection_psnr_offscreen(offscreen_session):
+    from chimerax.core.commands import run
+    from anaglyph.camera import AnaglyphCamera
+    session = offscreen_session
+    view = session.main_view
+    run(session, 'shape sphere radius 5 center 0,0,0', log=False)
+    run(session, 'shape cylinder radius 1.5 height 20 center 6,0,-6', log=False)
+    old_camera = view.camera
+    c = AnaglyphCamera(mode='reproject', eye_separation_scene=0.5)
+    c.position = old_camera.position
+    view.camera = c
+    try:
+        view.view_all()
+        # The hole filled reprojection must stay close to rendering both eyes.
+        assert reprojection_psnr(view, 160, 120) > 25
+        assert c.mode == 'reproject'
+    finally:
+        view.camera = old_camera
+        c.delete()
+        run(session, 'close', log=False)